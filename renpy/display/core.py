@@ -1261,6 +1261,7 @@ class Interface(object):
         renpy.display.render.free_memory()
         renpy.text.text.layout_cache_clear()
         renpy.display.video.texture.clear()
+        renpy.display.video.mask_texture.clear()
 
     def kill_surfaces(self):
         """
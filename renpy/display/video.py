@@ -22,11 +22,14 @@
 from __future__ import division, absolute_import, with_statement, print_function, unicode_literals
 from renpy.compat import PY2, basestring, bchr, bord, chr, open, pystr, range, round, str, tobytes, unicode # *
 
-import collections
 import re
 
 import renpy
 
+# Matches a filename with an angle-bracket prefix, like "<loop 1.0>movie.webm",
+# capturing the filename itself.
+_ANGLE_PREFIX_RE = re.compile(r'<.*>(.*)$')
+
 # The movie displayable that's currently being shown on the screen.
 current_movie = None
 
@@ -68,13 +71,15 @@ def movie_start(filename, size=None, loops=0):
     if size is not None:
         default_size = size
 
-    filename = [ filename ]
-
     if loops == -1:
         loop = True
     else:
         loop = False
-        filename = filename * (loops + 1)
+
+        # The channel enqueues each file separately, so repeats need to be
+        # given as a list. A single play can pass the filename as-is.
+        if loops:
+            filename = [ filename ] * (loops + 1)
 
     renpy.audio.music.play(filename, channel='movie', loop=loop)
 
@@ -86,8 +91,21 @@ movie_start_displayable = movie_start
 # on that channel.
 texture = { }
 
-# The set of channels that are being displayed in Movie objects.
-displayable_channels = collections.defaultdict(list)
+# A map from a channel name to the mask of the texture in texture, for
+# channels with masked movies. This is either the texture of the mask, or
+# True if the texture is a side-by-side frame.
+mask_texture = { }
+
+# A map from (channel, mask_channel) to the list of Movie objects being
+# displayed on those channels.
+displayable_channels = { }
+
+# Lists that were values of displayable_channels, and can be reused.
+channel_list_pool = [ ]
+
+# A list of (channel, mask_channel) audio channel objects, one for each key
+# of displayable_channels. mask_channel is None if there is no mask channel.
+displayable_channel_objects = [ ]
 
 # A map from a channel to the topmost Movie being displayed on
 # that channel. (Or None if no such movie exists.)
@@ -100,9 +118,15 @@ fullscreen = False
 # place.
 reset_channels = set()
 
-# These store the textures for movies in the same group.
+# These store the frames (from get_movie_frame) for movies in the same group.
 group_texture = { }
 
+# The set of groups that are being displayed in Movie objects.
+displayable_groups = set()
+
+# The number of Movie objects being displayed on the "movie" channel.
+movie_channel_displayables = 0
+
 
 def early_interact():
     """
@@ -110,9 +134,19 @@ def early_interact():
     flag.
     """
 
+    global movie_channel_displayables
+
+    for movies in displayable_channels.values():
+        del movies[:]
+        channel_list_pool.append(movies)
+
     displayable_channels.clear()
+    displayable_channel_objects[:] = [ ]
+    displayable_groups.clear()
     channel_movie.clear()
 
+    movie_channel_displayables = 0
+
 
 def interact():
     """
@@ -122,18 +156,14 @@ def interact():
 
     global fullscreen
 
-    for i in list(texture.keys()):
-        if not renpy.audio.music.get_playing(i):
-            del texture[i]
+    stopped = [ i for i in texture if not renpy.audio.music.get_playing(i) ]
 
-    if renpy.audio.music.get_playing("movie"):
+    for i in stopped:
+        del texture[i]
+        mask_texture.pop(i, None)
 
-        for i in displayable_channels.keys():
-            if i[0] == "movie":
-                fullscreen = False
-                break
-        else:
-            fullscreen = True
+    if renpy.audio.music.get_playing("movie"):
+        fullscreen = not movie_channel_displayables
 
     else:
         fullscreen = False
@@ -141,7 +171,17 @@ def interact():
     return fullscreen
 
 
-def get_movie_texture(channel, mask_channel=None, side_mask=False, mipmap=None):
+def get_movie_frame(channel, mask_channel=None, side_mask=False, mipmap=None):
+    """
+    Returns a (frame, new) tuple. frame is None if there is no frame of the
+    movie playing on `channel`, and otherwise a (texture, mask) tuple that
+    can be passed to apply_movie_mask. new is true if the frame was newly
+    decoded.
+
+    texture is the GLTexture of the frame. mask is None if the frame isn't
+    masked, True if texture holds a side-by-side frame that's split when
+    it's drawn, and otherwise the texture of the mask.
+    """
 
     if not renpy.audio.music.get_playing(channel):
         return None, False
@@ -151,11 +191,24 @@ def get_movie_texture(channel, mask_channel=None, side_mask=False, mipmap=None):
 
     if renpy.emscripten:
         # Use an optimized function for web
-        return get_movie_texture_web(channel, mask_channel, side_mask, mipmap)
+        return get_movie_frame_web(channel, mask_channel, side_mask, mipmap)
 
     c = renpy.audio.music.get_channel(channel)
     surf = c.read_video()
 
+    # When model-based rendering is in use, a side-by-side frame is loaded
+    # as a single texture, and is split by the GPU when the movie is drawn.
+    # This isn't done if the frame is too big to fit in one texture, or
+    # if mipmaps would blend the two halves together.
+    if (side_mask and (surf is not None) and (not mipmap) and renpy.display.render.models and
+            surf.get_width() <= renpy.display.draw.texture_loader.max_texture_width and
+            surf.get_height() <= renpy.display.draw.texture_loader.max_texture_height):
+
+        renpy.display.render.mutated_surface(surf)
+        tex = renpy.display.draw.load_texture(surf, True, { "mipmap" : mipmap })
+
+        return store_movie_frame(channel, tex, True), True
+
     if side_mask:
 
         if surf is not None:
@@ -178,25 +231,141 @@ def get_movie_texture(channel, mask_channel=None, side_mask=False, mipmap=None):
     if mask_surf is not None:
 
         # Something went wrong with the mask video.
-        if surf:
-            renpy.display.module.alpha_munge(mask_surf, surf, renpy.display.im.identity)
-        else:
+        if not surf:
             surf = None
 
+        # When model-based rendering is in use, the mask is applied by the
+        # GPU when the movie is drawn.
+        elif renpy.display.render.models:
+            renpy.display.render.mutated_surface(surf)
+            renpy.display.render.mutated_surface(mask_surf)
+
+            tex = renpy.display.draw.load_texture(surf, True, { "mipmap" : mipmap })
+            mask_tex = renpy.display.draw.load_texture(mask_surf, True, { "mipmap" : mipmap })
+
+            return store_movie_frame(channel, tex, mask_tex), True
+
+        else:
+            renpy.display.module.alpha_munge(mask_surf, surf, renpy.display.im.identity)
+
     if surf is not None:
         renpy.display.render.mutated_surface(surf)
         tex = renpy.display.draw.load_texture(surf, True, { "mipmap" : mipmap })
-        texture[channel] = tex
-        new = True
+
+        return store_movie_frame(channel, tex, None), True
+
+    return last_movie_frame(channel), False
+
+
+def store_movie_frame(channel, tex, mask):
+    """
+    Stores the textures of a newly decoded frame of the movie playing on
+    `channel`, and returns the frame.
+    """
+
+    texture[channel] = tex
+
+    if mask is None:
+        mask_texture.pop(channel, None)
     else:
-        tex = texture.get(channel, None)
-        new = False
+        mask_texture[channel] = mask
+
+    return (tex, mask)
+
+
+def last_movie_frame(channel):
+    """
+    Returns the last frame stored for `channel`, or None if there isn't
+    one.
+    """
+
+    tex = texture.get(channel, None)
+
+    if tex is None:
+        return None
+
+    return (tex, mask_texture.get(channel, None))
+
+
+def apply_movie_mask(frame):
+    """
+    Returns a texture or Render that draws `frame`, a frame returned by
+    get_movie_frame, or None if `frame` is None.
+
+    Masks are applied by a Render that's created each time this is called,
+    rather than stored with the textures, as a Render may be killed once
+    it's no longer being drawn.
+    """
+
+    if frame is None:
+        return None
+
+    tex, mask = frame
+
+    if mask is None:
+        return tex
+    elif mask is True:
+        return apply_side_mask(tex)
+    else:
+        return apply_alpha_mask(tex, mask)
+
+
+def get_movie_texture(channel, mask_channel=None, side_mask=False, mipmap=None):
+    """
+    Returns a (texture, new) tuple, where texture is a texture or Render
+    that draws the current frame of the movie playing on `channel` (or
+    None), and new is true if the frame was newly decoded.
+    """
+
+    frame, new = get_movie_frame(channel, mask_channel, side_mask, mipmap)
+    return apply_movie_mask(frame), new
+
+
+def apply_alpha_mask(tex, mask_tex):
+    """
+    Returns a Render that draws `tex`, using the red channel of `mask_tex`
+    as its alpha channel. This requires model-based rendering.
+    """
+
+    rv = renpy.display.render.Render(*tex.get_size())
+    rv.blit(tex, (0, 0))
+    rv.blit(mask_tex, (0, 0))
+
+    rv.mesh = True
+    rv.add_shader("renpy.alpha_mask")
 
-    return tex, new
+    return rv
+
+
+def apply_side_mask(tex):
+    """
+    Returns a Render that draws the left half of `tex`, using the red
+    channel of the right half as its alpha channel. This requires
+    model-based rendering.
+    """
+
+    tw, h = tex.get_size()
+    w = tw // 2
+
+    rv = renpy.display.render.Render(w, h)
+    rv.blit(tex, (0, 0))
+
+    rv.mesh = renpy.gl2.gl2mesh2.Mesh2.texture_rectangle(
+        0.0, 0.0, w, h,
+        0.0, 0.0, 1.0, 1.0,
+        )
+
+    rv.add_shader("renpy.side_mask")
 
-def get_movie_texture_web(channel, mask_channel, side_mask, mipmap):
+    # Half a texel, so samples stay inside their half of the texture.
+    rv.add_uniform("u_renpy_side_mask_inset", 0.5 / tw)
+
+    return rv
+
+
+def get_movie_frame_web(channel, mask_channel, side_mask, mipmap):
     """
-    This method returns either a GLTexture or a Render.
+    The web version of get_movie_frame.
     """
     c = renpy.audio.music.get_channel(channel)
     # read_video() returns a GLTexture for web
@@ -221,32 +390,14 @@ def get_movie_texture_web(channel, mask_channel, side_mask, mipmap):
     else:
         mask_tex = None
 
-    if mask_tex is not None:
-
-        # Something went wrong with the mask video.
-        if tex:
-            # Apply alpha using mask
-            rv = renpy.display.render.Render(*tex.get_size())
-            rv.blit(tex, (0, 0))
-            rv.blit(mask_tex, (0, 0))
-
-            rv.mesh = True
-            rv.add_shader("renpy.alpha_mask")
-
-            # Not a texture anymore
-            tex = rv
-
-        else:
-            tex = None
+    # Something went wrong with the mask video.
+    if (mask_tex is not None) and not tex:
+        tex = None
 
     if tex is not None:
-        texture[channel] = tex
-        new = True
-    else:
-        tex = texture.get(channel, None)
-        new = False
+        return store_movie_frame(channel, tex, mask_tex), True
 
-    return tex, new
+    return last_movie_frame(channel), False
 
 
 def resize_movie(r, width, height):
@@ -258,10 +409,15 @@ def resize_movie(r, width, height):
     if r is None:
         return None
 
-    rv = renpy.display.render.Render(width, height)
-
     sw, sh = r.get_size()
 
+    # A Render that's already the right size can be used as-is. (Textures
+    # still need to be wrapped, as callers expect a Render.)
+    if (sw == width) and (sh == height) and isinstance(r, renpy.display.render.Render):
+        return r
+
+    rv = renpy.display.render.Render(width, height)
+
     if not (sw and sh):
         return rv
 
@@ -417,6 +573,14 @@ class Movie(renpy.display.displayable.Displayable):
     loop = True
     group = None
 
+    # True once the channels this movie uses have been registered.
+    _channels_ensured = False
+
+    # The texture last drawn by this movie, and the Render that drew it.
+    _cached_frame = None
+    _cached_render = None
+
+    nosave = [ '_cached_frame', '_cached_render' ]
 
     def any_loadable(self, name):
         """
@@ -425,7 +589,7 @@ class Movie(renpy.display.displayable.Displayable):
         """
 
         if isinstance(name, basestring):
-            m = re.match(r'<.*>(.*)$', name)
+            m = _ANGLE_PREFIX_RE.match(name)
             if m:
                 name = m.group(1)
             return renpy.loader.loadable(name, directory="audio")
@@ -449,6 +613,8 @@ class Movie(renpy.display.displayable.Displayable):
             if self.mask_channel is not None:
                 self.mask_channel = self.channel + "_mask"
 
+        self._channels_ensured = False
+
     def ensure_channel(self, name):
 
         if name is None:
@@ -465,9 +631,15 @@ class Movie(renpy.display.displayable.Displayable):
         renpy.audio.music.register_channel(name, renpy.config.movie_mixer, loop=True, stop_on_mute=False, movie=True, framedrop=framedrop, force=True)
 
     def ensure_channels(self):
+
+        if self._channels_ensured:
+            return
+
         self.ensure_channel(self.channel)
         self.ensure_channel(self.mask_channel)
 
+        self._channels_ensured = True
+
     keep_last_frame_serial = 0
 
     def __init__(self, fps=24, size=None, channel="movie", play=None, mask=None, mask_channel=None, image=None, play_callback=None, side_mask=False, loop=True, start_image=None, group=None, keep_last_frame=False, **properties):
@@ -523,6 +695,7 @@ class Movie(renpy.display.displayable.Displayable):
     def set_transform_event(self, event):
         if event == "show":
             reset_channels.add(self.channel)
+            self._cached_render = None
 
     def render(self, width, height, st, at):
 
@@ -543,6 +716,9 @@ class Movie(renpy.display.displayable.Displayable):
             not_playing = False
 
         if (self.image is not None) and not_playing:
+            self._cached_frame = None
+            self._cached_render = None
+
             surf = renpy.display.render.render(self.image, width, height, st, at)
             w, h = surf.get_size()
             rv = renpy.display.render.Render(w, h)
@@ -550,31 +726,56 @@ class Movie(renpy.display.displayable.Displayable):
 
             return rv
 
-        tex, _ = get_movie_texture(self.channel, self.mask_channel, self.side_mask, self.style.mipmap)
+        frame, _ = get_movie_frame(self.channel, self.mask_channel, self.side_mask, self.style.mipmap)
 
         if self.group is not None:
-            if tex is None:
-                tex = group_texture.get(self.group, None)
+            if frame is None:
+                frame = group_texture.get(self.group, None)
             else:
-                group_texture[self.group] = tex
+                group_texture[self.group] = frame
 
-        if (not not_playing) and (tex is not None):
-            width, height = tex.get_size()
+        if (not not_playing) and (frame is not None):
 
-            rv = renpy.display.render.Render(width, height)
-            rv.blit(tex, (0, 0))
+            rv = self._cached_render
 
-        elif (not not_playing) and (self.start_image is not None):
-            surf = renpy.display.render.render(self.start_image, width, height, st, at)
-            w, h = surf.get_size()
-            rv = renpy.display.render.Render(w, h)
-            rv.blit(surf, (0, 0))
+            # Between video frames, the frame is unchanged, so the Render
+            # that drew it last time can be reused.
+            if (rv is None) or (self._cached_frame != frame) or rv.killed:
+                tex = apply_movie_mask(frame)
+                width, height = tex.get_size()
+
+                rv = renpy.display.render.Render(width, height)
+                rv.blit(tex, (0, 0))
+
+                if self.size is not None:
+                    rv = resize_movie(rv, self.size[0], self.size[1])
+
+                self._cached_frame = frame
+                self._cached_render = rv
+
+            else:
+                # renpy.display.render.render() adds the displayables the
+                # Render is of each time it's returned, so reset the list to
+                # keep it from growing.
+                del rv.render_of[:]
 
         else:
-            rv = renpy.display.render.Render(0, 0)
 
-        if self.size is not None:
-            rv = resize_movie(rv, self.size[0], self.size[1])
+            # Don't keep the last frame's texture alive while not playing.
+            self._cached_frame = None
+            self._cached_render = None
+
+            if (not not_playing) and (self.start_image is not None):
+                surf = renpy.display.render.render(self.start_image, width, height, st, at)
+                w, h = surf.get_size()
+                rv = renpy.display.render.Render(w, h)
+                rv.blit(surf, (0, 0))
+
+            else:
+                rv = renpy.display.render.Render(0, 0)
+
+            if self.size is not None:
+                rv = resize_movie(rv, self.size[0], self.size[1])
 
         # Usually we get redrawn when the frame is ready - but we want
         # the movie to disappear if it's ended, or if it hasn't started
@@ -609,19 +810,54 @@ class Movie(renpy.display.displayable.Displayable):
     def stop(self):
         self.ensure_channels()
 
+        self._cached_frame = None
+        self._cached_render = None
+
         if self._play:
-            if renpy.audio.music.channel_defined(self.channel):
-                renpy.audio.music.stop(channel=self.channel, fadeout=0)
+            music = renpy.audio.music
+
+            if music.channel_defined(self.channel):
+                music.stop(channel=self.channel, fadeout=0)
 
             if self.mask:
-                if renpy.audio.music.channel_defined(self.mask_channel):
-                    renpy.audio.music.stop(channel=self.mask_channel, fadeout=0) # type: ignore
+                if music.channel_defined(self.mask_channel):
+                    music.stop(channel=self.mask_channel, fadeout=0) # type: ignore
 
     def per_interact(self):
 
+        global movie_channel_displayables
+
         self.ensure_channels()
 
-        displayable_channels[(self.channel, self.mask_channel)].append(self)
+        channels = (self.channel, self.mask_channel)
+
+        movies = displayable_channels.get(channels, None)
+
+        if movies is None:
+            c = renpy.audio.audio.get_channel(self.channel)
+
+            if self.mask_channel:
+                mc = renpy.audio.audio.get_channel(self.mask_channel)
+            else:
+                mc = None
+
+            displayable_channel_objects.append((c, mc))
+
+            if channel_list_pool:
+                movies = channel_list_pool.pop()
+            else:
+                movies = [ ]
+
+            displayable_channels[channels] = movies
+
+        movies.append(self)
+
+        if self.channel == "movie":
+            movie_channel_displayables += 1
+
+        if self.group is not None:
+            displayable_groups.add(self.group)
+
         renpy.display.render.redraw(self, 0)
 
     def visit(self):
@@ -646,22 +882,23 @@ def update_playing():
     Calls play/stop on Movie displayables.
     """
 
-    old_channel_movie = renpy.game.context().movie
+    context = renpy.game.context()
+    old_channel_movie = context.movie
+
+    replay = renpy.config.replay_movie_sprites
 
     for c, m in channel_movie.items():
 
         old = old_channel_movie.get(c, None)
 
-        if (c in reset_channels) and renpy.config.replay_movie_sprites:
-            m.play(old)
-        elif old is not m:
+        if (old is not m) or (replay and (c in reset_channels)):
             m.play(old)
 
     for c, m in old_channel_movie.items():
         if c not in channel_movie:
             m.stop()
 
-    renpy.game.context().movie = dict(channel_movie)
+    context.movie = dict(channel_movie)
     reset_channels.clear()
 
 def frequent():
@@ -674,16 +911,13 @@ def frequent():
 
     renpy.audio.audio.advance_time()
 
-    # Cycle the group textures.
-    global group_texture
-
-    old_group_texture = group_texture
-    group_texture = { }
-
-    for movies in displayable_channels.values():
-        for m in movies:
-            if m.group is not None:
-                group_texture[m.group] = old_group_texture.get(m.group, None)
+    # Cycle the group textures, adding groups that are newly displayed and
+    # removing the ones that are no longer displayed.
+    for g in displayable_groups.symmetric_difference(group_texture):
+        if g in displayable_groups:
+            group_texture[g] = None
+        else:
+            del group_texture[g]
 
     if fullscreen:
 
@@ -699,19 +933,15 @@ def frequent():
 
         update = True
 
-        for i in displayable_channels:
-            channel, mask_channel = i
+        for c, mc in displayable_channel_objects:
 
-            c = renpy.audio.audio.get_channel(channel)
             if not c.video_ready():
                 update = False
                 break
 
-            if mask_channel:
-                c = renpy.audio.audio.get_channel(mask_channel)
-                if not c.video_ready():
-                    update = False
-                    break
+            if (mc is not None) and not mc.video_ready():
+                update = False
+                break
 
         if update:
             for v in displayable_channels.values():